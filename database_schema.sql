@@ -40,7 +40,8 @@ CREATE TABLE parents (
 
 CREATE INDEX idx_parents_name ON parents(full_name);
 CREATE INDEX idx_parents_email ON parents(email) WHERE email IS NOT NULL;
-CREATE INDEX idx_parents_phone ON parents(phone_number) WHERE phone_number IS NOT NULL;
+-- Weekly ETL matches parents by phone; enforce one parent per phone
+CREATE UNIQUE INDEX idx_parents_phone ON parents(phone_number) WHERE phone_number IS NOT NULL AND phone_number <> '';
 CREATE INDEX idx_parents_secondary_phone ON parents(secondary_phone_number) WHERE secondary_phone_number IS NOT NULL;
 CREATE INDEX idx_parents_active ON parents(is_active);
 
@@ -137,6 +138,8 @@ CREATE TRIGGER trigger_update_child_fields
 
 CREATE INDEX idx_children_parent ON children(parent_id);
 CREATE INDEX idx_children_name ON children(full_name);
+-- Weekly ETL matches children by parent + name + age; enforce one child per match
+CREATE UNIQUE INDEX idx_children_identity ON children(parent_id, UPPER(full_name), age);
 CREATE INDEX idx_children_age_group ON children(age_group);
 CREATE INDEX idx_children_active ON children(is_active);
 
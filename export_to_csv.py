@@ -15,23 +15,71 @@ Scope:
 import pandas as pd
 from datetime import datetime
 
+# calamine (pip install python-calamine, pandas >= 2.2) parses xlsx much faster than
+# openpyxl; fall back to openpyxl when either is missing
+try:
+    import python_calamine  # noqa: F401
+    pandas_version = tuple(int(part) for part in pd.__version__.split('.')[:2])
+    EXCEL_ENGINE = 'calamine' if pandas_version >= (2, 2) else 'openpyxl'
+except ImportError:
+    EXCEL_ENGINE = 'openpyxl'
+
 # Load Excel file
 excel_file = 'junior_church_dummy_data.xlsx'
-sheets = pd.read_excel(excel_file, sheet_name=None)
+sheets = pd.read_excel(excel_file, sheet_name=None, engine=EXCEL_ENGINE)
 
 # For this example, assuming all sheets(services) are from the same date
 # In production, we'd have actual dates
 ATTENDANCE_DATE = '2026-01-26' # YYYY-MM-DD
 
+# Set to True to write gzip-compressed .csv.gz files (smaller on disk, readable by most loaders)
+COMPRESS_EXPORTS = False
+WRITE_BUFFER_SIZE = 1024 * 1024  # 1 MB
+
 print(f"\nProcessing attendance for date: {ATTENDANCE_DATE}")
 
 # STEP 1: CREATE UNIQUE PARENTS (dedupe across sheets)
 print("\n1. Creating unique parents...")
 
-all_data = []
-for sheet_name, df in sheets.items():
-    all_data.append(df)
-combined_df = pd.concat(all_data, ignore_index=True)
+# One master frame for all three outputs; each sheet is a service ("First Service", "Second Service", etc.)
+combined_df = pd.concat(
+    [df.assign(service_name=sheet_name) for sheet_name, df in sheets.items()],
+    ignore_index=True
+)
+
+# Low-cardinality text repeats on every row; category dtype stores it as integer codes
+for col in ['service_name', 'Gender', 'Role In Church', 'Department In Church']:
+    combined_df[col] = combined_df[col].astype('category')
+
+# A sheet export may lack some per-child columns; add them as blanks so they get the usual defaults
+child_columns = ['Full Name of Child {}', 'Age of Child {}', 'Gender of Child {}',
+                 'Special Needs of Child {}', 'Relationship With Child {}', 'Child {} (check-in)']
+missing_cols = [col.format(n) for n in range(1, 4) for col in child_columns
+                if col.format(n) not in combined_df.columns]
+combined_df = combined_df.reindex(columns=[*combined_df.columns, *missing_cols])
+
+# Clean the per-child columns once, column by column
+for child_num in range(1, 4):
+    age_col = f'Age of Child {child_num}'
+    checkin_col = f'Child {child_num} (check-in)'
+    gender_col = f'Gender of Child {child_num}'
+    needs_col = f'Special Needs of Child {child_num}'
+    relationship_col = f'Relationship With Child {child_num}'
+
+    # Blank ages become 0, giving a plain integer column with no NaN checks later
+    combined_df[age_col] = combined_df[age_col].fillna(0).astype('int64')
+
+    # Blank or non-numeric check-ins become 0 (not present); values are kept as-is so only 1 counts
+    combined_df[checkin_col] = pd.to_numeric(combined_df[checkin_col], errors='coerce').fillna(0)
+
+    combined_df[gender_col] = combined_df[gender_col].fillna('Unknown').astype(str).str.strip()
+    combined_df[needs_col] = combined_df[needs_col].astype('string').str.strip()
+    combined_df[relationship_col] = combined_df[relationship_col].fillna('Child').astype(str).str.strip()
+
+# Child genders share one category dtype so they stay categorical once the slots are stacked
+gender_cols = [f'Gender of Child {child_num}' for child_num in range(1, 4)]
+child_gender_dtype = pd.CategoricalDtype(pd.unique(combined_df[gender_cols].to_numpy().ravel()))
+combined_df[gender_cols] = combined_df[gender_cols].astype(child_gender_dtype)
 
 parent_cols = ['ID', 'Full Name', 'Email', 'Gender', 'Role In Church',
                'Department In Church', 'Phone Number', 'Secondary Phone Number', 'Address']
@@ -51,111 +99,89 @@ unique_parents.insert(0, 'parent_id', range(1, len(unique_parents) + 1))
 
 parent_mapping = dict(zip(unique_parents['original_id'], unique_parents['parent_id']))
 
+# Resolve every submission's parent_id up front; rows without a known parent are dropped
+combined_df['parent_id'] = combined_df['ID'].map(parent_mapping)
+combined_df = combined_df.dropna(subset=['parent_id'])
+combined_df['parent_id'] = combined_df['parent_id'].astype(int)
+
 print(f"  done creating {len(unique_parents)} unique parents")
 
 # STEP 2: CREATE UNIQUE CHILDREN (dedupe across sheets)
 print("\n2. Creating unique children...")
 
-all_children = []
-
-for sheet_name, df in sheets.items():
-    for _, row in df.iterrows():
-        parent_original_id = row['ID']
-        parent_id = parent_mapping.get(parent_original_id)
-        
-        if parent_id is None:
-            continue
-        
-        for child_num in range(1, 4):
-            child_name = row.get(f'Full Name of Child {child_num}')
-            
-            if pd.isna(child_name) or str(child_name).strip() == '':
-                continue
-            
-            child_age = int(row.get(f'Age of Child {child_num}', 0)) if not pd.isna(row.get(f'Age of Child {child_num}')) else 0
-            
-            child_record = {
-                'parent_id': parent_id,
-                'full_name': str(child_name).strip(),
-                'age': child_age,
-                'gender': str(row.get(f'Gender of Child {child_num}', 'Unknown')).strip(),
-                'special_needs': None if pd.isna(row.get(f'Special Needs of Child {child_num}')) else str(row.get(f'Special Needs of Child {child_num}')).strip(),
-                'relationship_to_parent': 'Child' if pd.isna(row.get(f'Relationship With Child {child_num}')) else str(row.get(f'Relationship With Child {child_num}')).strip(),
-                'dedupe_key': f"{parent_id}_{str(child_name).strip().upper()}_{child_age}"
-            }
-            
-            all_children.append(child_record)
-
-children_df = pd.DataFrame(all_children)
+
+def melt_children(df, columns):
+    """
+    Reshape the wide per-child columns into one row per (submission, child slot)
+
+    `columns` maps a column template such as 'Age of Child {}' to its output name;
+    columns without a placeholder are repeated for every child slot.
+    Rows keep their original submission order, with child slots 1-3 in turn.
+    """
+    frames = [
+        df[[col.format(n) for col in columns]].set_axis(list(columns.values()), axis=1)
+        for n in range(1, 4)
+    ]
+    long_df = pd.concat(frames, keys=range(1, 4), names=['child_num', 'row'])
+    long_df = long_df.swaplevel().sort_index()
+
+    # Drop empty child slots
+    has_name = long_df['full_name'].notna() & long_df['full_name'].astype(str).str.strip().ne('')
+    long_df = long_df[has_name].reset_index(drop=True)
+
+    long_df['full_name'] = long_df['full_name'].astype(str).str.strip()
+    long_df['full_name_upper'] = long_df['full_name'].str.upper()
+    return long_df
+
+
+child_fields = {
+    'parent_id': 'parent_id',
+    'Full Name of Child {}': 'full_name',
+    'Age of Child {}': 'age',
+    'Gender of Child {}': 'gender',
+    'Special Needs of Child {}': 'special_needs',
+    'Relationship With Child {}': 'relationship_to_parent',
+    'Child {} (check-in)': 'check_in',
+    'service_name': 'service_name',
+}
+
+# Children and attendance both come from this one long-form pass over all sheets
+long_df = melt_children(combined_df, child_fields)
+
+children_df = long_df[['parent_id', 'full_name', 'age', 'gender', 'special_needs',
+                       'relationship_to_parent', 'full_name_upper']]
+
 print(f"   Before deduplication: {len(children_df)} child records")
 
-# Deduplicate children
-children_unique = children_df.drop_duplicates(subset=['dedupe_key'], keep='first').copy()
-children_unique = children_unique.drop(columns=['dedupe_key']).reset_index(drop=True)
+# Deduplicate children on (parent_id + name + age)
+child_key = ['parent_id', 'full_name_upper', 'age']
+children_unique = children_df.drop_duplicates(subset=child_key, keep='first', ignore_index=True)
 children_unique.insert(0, 'child_id', range(1, len(children_unique) + 1))
 
-print(f"   After deduplication: {len(children_unique)} unique children")
+# Reverse mapping: (parent_id + name + age) → child_id
+child_lookup = children_unique[child_key + ['child_id']]
+children_unique = children_unique.drop(columns=['full_name_upper'])
 
-# Create reverse mapping: (parent_id + name + age) → child_id
-child_lookup = {}
-for _, child in children_unique.iterrows():
-    key = f"{child['parent_id']}_{child['full_name'].upper()}_{child['age']}"
-    child_lookup[key] = child['child_id']
+print(f"   After deduplication: {len(children_unique)} unique children")
 
 
 # STEP 3: CREATE ATTENDANCE RECORDS (one per service per child)
 print("\n3. Creating attendance records...")
 
-all_attendance = []
-
-for sheet_name, df in sheets.items():
-    service_name = sheet_name  # "First Service", "Second Service", etc.
-    
-    for _, row in df.iterrows():
-        parent_original_id = row['ID']
-        parent_id = parent_mapping.get(parent_original_id)
-        
-        if parent_id is None:
-            continue
-        
-        for child_num in range(1, 4):
-            child_name = row.get(f'Full Name of Child {child_num}')
-            
-            if pd.isna(child_name) or str(child_name).strip() == '':
-                continue
-            
-            child_age = int(row.get(f'Age of Child {child_num}', 0)) if not pd.isna(row.get(f'Age of Child {child_num}')) else 0
-            
-            # Find the child_id from our lookup
-            lookup_key = f"{parent_id}_{str(child_name).strip().upper()}_{child_age}"
-            child_id = child_lookup.get(lookup_key)
-            
-            if child_id is None:
-                print(f"Warning: Could not find child_id for {lookup_key}")
-                continue
-            
-            # Check if child was present (check-in column has value)
-            checkin_col = f'Child {child_num} (check-in)'
-            checkout_col = f'Child {child_num} (check-out)'
-            
-            was_present = False
-            if checkin_col in row and not pd.isna(row[checkin_col]) and row[checkin_col] == 1:
-                was_present = True
-            
-            # Only create attendance record if child was present
-            if was_present:
-                attendance_record = {
-                    'child_id': child_id,
-                    'service_name': service_name,
-                    'attendance_date': ATTENDANCE_DATE,
-                    'check_in_time': None,  # Time not available in current data
-                    'check_out_time': None,
-                    'was_present': True
-                }
-                
-                all_attendance.append(attendance_record)
-
-attendance_df = pd.DataFrame(all_attendance)
+# Only create attendance records for children who were present (check-in column is 1);
+# blank check-ins compare False, so the mask is taken before looking up child_ids
+present = long_df['check_in'].eq(1)
+attendance_df = (
+    long_df.loc[present, child_key + ['service_name']]
+    .merge(child_lookup, on=child_key, how='left')
+    [['child_id', 'service_name']]
+    .assign(
+        attendance_date=ATTENDANCE_DATE,
+        check_in_time=None,  # Time not available in current data
+        check_out_time=None,
+        was_present=True
+    )
+)
 
 # Add attendance_id
 if len(attendance_df) > 0:
@@ -168,16 +194,28 @@ else:
 # STEP 4: EXPORT FILES
 print("\n4. Exporting files...")
 
+
+def export_csv(df, filename):
+    """Write df through a large write buffer (gzip-compressed if enabled), returning the file name"""
+    if COMPRESS_EXPORTS:
+        filename += '.gz'
+        df.to_csv(filename, index=False, compression='gzip')
+    else:
+        with open(filename, 'w', encoding='utf-8', newline='', buffering=WRITE_BUFFER_SIZE) as f:
+            df.to_csv(f, index=False)
+    return filename
+
+
 parents_export = unique_parents.drop(columns=['original_id'])
-parents_export.to_csv('parents_final.csv', index=False)
-print(f" Exported parents_final.csv ({len(parents_export)} records)")
+filename = export_csv(parents_export, 'parents_final.csv')
+print(f" Exported {filename} ({len(parents_export)} records)")
 
-children_unique.to_csv('children_final.csv', index=False)
-print(f" Exported children_final.csv ({len(children_unique)} records)")
+filename = export_csv(children_unique, 'children_final.csv')
+print(f" Exported {filename} ({len(children_unique)} records)")
 
 if len(attendance_df) > 0:
-    attendance_df.to_csv('attendance_final.csv', index=False)
-    print(f" Exported attendance_final.csv ({len(attendance_df)} records)")
+    filename = export_csv(attendance_df, 'attendance_final.csv')
+    print(f" Exported {filename} ({len(attendance_df)} records)")
 
 # VALIDATION
 print("\n5. Validation:")
@@ -11,23 +11,36 @@ Design Notes:
 - Intended for scheduled, non-interactive execution (cron / CI / server)
 """
 
+import io
+import os
+import numpy as np
 import pandas as pd
 import psycopg2
 import logging
 from datetime import date
+from psycopg2.extras import execute_values
 
 # CONFIGURATION
 SPREADSHEET_ID = "YOUR_SPREADSHEET_ID_HERE"
 CSV_EXPORT_URL = f"https://docs.google.com/spreadsheets/d/{SPREADSHEET_ID}/export?format=csv"
 
+# Connection settings come from the environment so the password is never stored in code
 DB_CONFIG = {
-    "host": "db.jpzgfrmthhillxoncmgs.supabase.co",
-    "database": "postgres",
-    "user": "postgres",
-    "password": "HODTech2026",  # move to env in real setup
-    "port": 5432
+    "host": os.environ.get("DB_HOST", "db.jpzgfrmthhillxoncmgs.supabase.co"),
+    "database": os.environ.get("DB_NAME", "postgres"),
+    "user": os.environ.get("DB_USER", "postgres"),
+    "password": os.environ.get("DB_PASSWORD"),
+    "port": int(os.environ.get("DB_PORT", 5432))
 }
 
+# Rows sent per INSERT statement when batching
+PAGE_SIZE = 500
+
+# Rows fetched per round trip when streaming existing parents/children
+LOOKUP_BATCH_SIZE = 1000
+
+VALID_GENDERS = ['Male', 'Female']
+
 logging.basicConfig(
     level=logging.INFO,
     format='%(asctime)s - %(levelname)s - %(message)s'
@@ -47,14 +60,30 @@ def extract_attendance():
         raise
 
 # TRANSFORM + LOAD
+def stream_query(conn, name, query, params):
+    """Run a read query on a named (server-side) cursor, fetching rows in batches"""
+    with conn.cursor(name=name) as cursor:
+        cursor.itersize = LOOKUP_BATCH_SIZE
+        cursor.execute(query, params)
+        yield from cursor
+
+
+def clean_text(df, column, default=''):
+    """Return a column as stripped strings, with blanks (or a missing column) set to default"""
+    if column not in df.columns:
+        return pd.Series(default, index=df.index)
+    return df[column].fillna(default).astype(str).str.strip()
+
+
 def process_attendance(df, conn):
     """
-    Process each form submission and update database
-    
+    Process all form submissions and update database in batches
+
     Logic:
-    1. For each submission, find or create parent by phone
-    2. For each child in submission, find or create child
-    3. Record attendance for each child
+    1. Clean all submissions column by column into parent, child and attendance batches
+    2. Find or create all parents by phone in one round trip each
+    3. Find or create all children by parent + name + age in one round trip each
+    4. Record attendance for each child in one statement
     """
     cursor = conn.cursor()
     stats = {
@@ -67,136 +96,146 @@ def process_attendance(df, conn):
         'errors': 0
     }
 
-    for idx, row in df.iterrows():
-        try:
-            parent_name = str(row.get("Your Name", "")).strip()
-            parent_phone = str(row.get("Your Phone", "")).strip()
-            parent_gender = str(row.get("Your Gender", "Male")).strip()
-
-            # Validate required fields
-            if not parent_phone or not parent_name:
-                logger.warning(f"Row {idx}: Missing parent name or phone, skipping")
-                stats['errors'] += 1
-                continue
-
-            # Validate gender value
-            if parent_gender not in ['Male', 'Female']:
-                logger.warning(f"Row {idx}: Invalid gender '{parent_gender}', defaulting to 'Male'")
-                parent_gender = 'Male'
-
-            # Extract attendance date from form timestamp
-            timestamp = row.get('Timestamp', '')
-            if timestamp:
-                attendance_date = pd.to_datetime(timestamp).date()
-            else:
-                attendance_date = date.today()
-
-            logger.info(f"Processing submission {idx+1}/{len(df)}: {parent_name}")
-
-            # PARENT: Find or create
-            cursor.execute(
-                "SELECT parent_id FROM parents WHERE phone_number = %s",
-                (parent_phone,)
-            )
-            result = cursor.fetchone()
-
-            if result:
-                # EXISTING PARENT
-                parent_id = result[0]
-                stats['existing_parents'] += 1
-                logger.info(f" Found existing parent (ID={parent_id})")
-            else:
-                # NEW PARENT - Create record
-                cursor.execute(
-                    """
-                    INSERT INTO parents (full_name, phone_number, gender)
-                    VALUES (%s, %s, %s)
-                    RETURNING parent_id
-                    """,
-                    (parent_name, parent_phone, parent_gender)
-                )
-                parent_id = cursor.fetchone()[0]
-                stats['new_parents'] += 1
-                logger.info(f" Created new parent (ID={parent_id}): {parent_name}, {parent_gender}")
-
-            # CHILDREN + ATTENDANCE
-            for child_num in range(1, 4):
-                child_name = str(row.get(f"Child {child_num} Name", "")).strip()
-                
-                # Skip if no child name provided
-                if not child_name:
-                    continue
-
-                # Extract child details
-                child_age = row.get(f"Child {child_num} Age", 0)
-                child_gender = str(row.get(f"Child {child_num} Gender", "Male")).strip()
-                
-                # Validate and clean
-                try:
-                    child_age = int(child_age) if not pd.isna(child_age) else 0
-                except:
-                    child_age = 0
-                
-                if child_gender not in ['Male', 'Female']:
-                    child_gender = 'Male'
-                
-                # Extract service name
-                service_name = str(row.get("Which Service", "First Service")).strip()
-
-                # CHILD: Find or create
-                cursor.execute(
-                    """
-                    SELECT child_id FROM children
-                    WHERE parent_id = %s
-                      AND UPPER(full_name) = UPPER(%s)
-                      AND age = %s
-                    """,
-                    (parent_id, child_name, child_age)
-                )
-                result = cursor.fetchone()
-
-                if result:
-                    # EXISTING CHILD
-                    child_id = result[0]
-                    stats['existing_children'] += 1
-                    logger.info(f" Found existing child (ID={child_id}): {child_name}")
-                else:
-                # NEW CHILD - Create record
-                    cursor.execute(
-                        """
-                        INSERT INTO children (parent_id, full_name, age, gender)
-                        VALUES (%s, %s, %s, %s)
-                        RETURNING child_id
-                        """,
-                        (parent_id, child_name, child_age, child_gender)
-                    )
-                    child_id = cursor.fetchone()[0]
-                    stats['new_children'] += 1
-                    logger.info(f" Created new child (ID={child_id}): {child_name}, age {child_age}, {child_gender}")
-
-
-                # ATTENDANCE: Record (idempotent)
-                cursor.execute(
-                    """
-                    INSERT INTO attendance (child_id, service_name, attendance_date, was_present)
-                    VALUES (%s, %s, %s, TRUE)
-                    ON CONFLICT (child_id, service_name, attendance_date) DO NOTHING
-                    """,
-                    (child_id, service_name, attendance_date)
-                )
-                
-                # Check if row was actually inserted (not a duplicate)
-                if cursor.rowcount > 0:
-                    stats['attendance_recorded'] += 1
-                    logger.info(f"  Recorded attendance: {service_name} on {attendance_date}")
-                else:
-                    logger.info(f"  Attendance already recorded (duplicate)")
-
-
-        except Exception as e:
-            logger.error(f"Error processing row {idx}: {e}")
-            stats['errors'] += 1
-            continue
+    # Re-submitted forms are identical rows; collapse them before any further work
+    df = df.copy()
+    df['Your Phone'] = df['Your Phone'].fillna('').astype(str).str.strip()
+    dedupe_cols = ['Your Phone', 'Child 1 Name', 'Child 2 Name', 'Child 3 Name', 'Which Service', 'Timestamp']
+    df = df.drop_duplicates(subset=[col for col in dedupe_cols if col in df.columns])
+    logger.info(f"Kept {len(df)} of {stats['total_submissions']} submissions after removing duplicates "
+                f"({len(df) / max(stats['total_submissions'], 1):.0%})")
+
+    df['Your Name'] = clean_text(df, 'Your Name')
+    df['Your Gender'] = clean_text(df, 'Your Gender', 'Male')
+    df['Which Service'] = clean_text(df, 'Which Service', 'First Service')
+
+    # Validate required fields
+    missing_parent = df['Your Phone'].eq('') | df['Your Name'].eq('')
+    for idx in df.index[missing_parent]:
+        logger.warning(f"Row {idx}: Missing parent name or phone, skipping")
+    stats['errors'] += int(missing_parent.sum())
+    df = df[~missing_parent].copy()
+
+    # Validate gender value
+    invalid_gender = ~df['Your Gender'].isin(VALID_GENDERS)
+    if invalid_gender.any():
+        logger.warning(f"{invalid_gender.sum()} submissions with invalid gender, defaulting to 'Male'")
+    df['Your Gender'] = np.where(invalid_gender, 'Male', df['Your Gender'])
+
+    # Extract attendance date from form timestamp; each value is parsed on its own format,
+    # and only blank timestamps fall back to today
+    timestamps = clean_text(df, 'Timestamp')
+    parsed = pd.to_datetime(timestamps, format='mixed', errors='coerce')
+    unreadable = parsed.isna() & timestamps.ne('')
+    if unreadable.any():
+        logger.warning(f"{unreadable.sum()} submissions with unreadable timestamps, skipping")
+        stats['errors'] += int(unreadable.sum())
+        df, parsed = df[~unreadable].copy(), parsed[~unreadable]
+    df['attendance_date'] = parsed.dt.date.fillna(date.today())
+
+    # One row per (submission, child slot), keeping submission order
+    child_frames = []
+    for child_num in range(1, 4):
+        age_col = f"Child {child_num} Age"
+        ages = df[age_col] if age_col in df.columns else pd.Series(0, index=df.index)
+
+        child_frames.append(pd.DataFrame({
+            'phone_number': df['Your Phone'],
+            'full_name': clean_text(df, f"Child {child_num} Name"),
+            'age': pd.to_numeric(ages, errors='coerce').fillna(0).astype(int),
+            'gender': clean_text(df, f"Child {child_num} Gender", 'Male'),
+            'service_name': df['Which Service'],
+            'attendance_date': df['attendance_date']
+        }))
+    children_long = pd.concat(child_frames, keys=range(1, 4)).swaplevel().sort_index()
+
+    # Skip if no child name provided
+    children_long = children_long[children_long['full_name'].ne('')].reset_index(drop=True)
+    children_long['gender'] = np.where(children_long['gender'].isin(VALID_GENDERS), children_long['gender'], 'Male')
+    children_long['name_key'] = children_long['full_name'].str.upper()
+
+    logger.info(f"Cleaned {len(df)} submissions, {len(children_long)} children")
+
+    # One row per parent / child; the first submission wins, as with find-or-create
+    parents_batch = df[['Your Name', 'Your Phone', 'Your Gender']].set_axis(['full_name', 'phone_number', 'gender'], axis=1)
+    parents_batch = parents_batch.drop_duplicates(subset=['phone_number'], ignore_index=True)
+
+    children_batch = children_long[['phone_number', 'full_name', 'name_key', 'age', 'gender']]
+    children_batch = children_batch.drop_duplicates(subset=['phone_number', 'name_key', 'age'], ignore_index=True)
+
+    attendance_batch = children_long[['phone_number', 'name_key', 'age', 'service_name', 'attendance_date']].copy()
+
+    # PARENTS: Find existing parents in one query, then create the rest in one statement
+    parent_cache = dict(stream_query(
+        conn, 'existing_parents',
+        "SELECT phone_number, parent_id FROM parents WHERE phone_number = ANY(%s)",
+        (parents_batch['phone_number'].tolist(),)
+    ))
+
+    new_parents = parents_batch[~parents_batch['phone_number'].isin(parent_cache)]
+    created = []
+    if len(new_parents) > 0:
+        created = execute_values(
+            cursor,
+            """
+            INSERT INTO parents (full_name, phone_number, gender)
+            VALUES %s
+            RETURNING phone_number, parent_id
+            """,
+            list(new_parents.itertuples(index=False, name=None)),
+            page_size=PAGE_SIZE,
+            fetch=True
+        )
+        parent_cache.update(created)
+
+    stats['new_parents'] = len(created)
+    stats['existing_parents'] = len(parents_batch) - len(created)
+    logger.info(f" Found {stats['existing_parents']} existing parents, created {stats['new_parents']}")
+
+    # CHILDREN: Same pattern, keyed on parent + name + age
+    children_batch['parent_id'] = children_batch['phone_number'].map(parent_cache)
+    # Names are uppercased in Python on both sides so the keys always match name_key
+    # (Postgres UPPER() depends on the database locale)
+    existing_children = stream_query(
+        conn, 'existing_children',
+        "SELECT parent_id, full_name, age, child_id FROM children WHERE parent_id = ANY(%s)",
+        (children_batch['parent_id'].unique().tolist(),)
+    )
+    child_cache = {(parent_id, full_name.upper(), age): child_id
+                   for parent_id, full_name, age, child_id in existing_children}
+
+    child_keys = zip(children_batch['parent_id'], children_batch['name_key'], children_batch['age'])
+    is_new = np.array([key not in child_cache for key in child_keys], dtype=bool)
+    new_children = children_batch.loc[is_new]
+    created = []
+    if len(new_children) > 0:
+        created = execute_values(
+            cursor,
+            """
+            INSERT INTO children (parent_id, full_name, age, gender)
+            VALUES %s
+            RETURNING parent_id, full_name, age, child_id
+            """,
+            list(new_children[['parent_id', 'full_name', 'age', 'gender']].itertuples(index=False, name=None)),
+            page_size=PAGE_SIZE,
+            fetch=True
+        )
+        child_cache.update({(parent_id, full_name.upper(), age): child_id
+                            for parent_id, full_name, age, child_id in created})
+
+    stats['new_children'] = len(created)
+    stats['existing_children'] = len(children_batch) - len(created)
+    logger.info(f" Found {stats['existing_children']} existing children, created {stats['new_children']}")
+
+    # ATTENDANCE: Record (idempotent)
+    attendance_batch['child_id'] = [
+        child_cache[(parent_cache[phone], name_key, age)]
+        for phone, name_key, age in zip(attendance_batch['phone_number'], attendance_batch['name_key'], attendance_batch['age'])
+    ]
+
+    if len(attendance_batch) == 0:
+        logger.info(" No attendance to record")
+    else:
+        record_attendance(cursor, attendance_batch, stats)
 
     conn.commit()
     cursor.close()
@@ -210,6 +249,41 @@ def process_attendance(df, conn):
     logger.info(f"  Errors: {stats['errors']}")
     logger.info("="*60)
 
+
+def record_attendance(cursor, attendance_batch, stats):
+    """Stage the batch with COPY, then insert from the staging table in one statement (idempotent)"""
+    cursor.execute(
+        """
+        CREATE TEMP TABLE tmp_attendance (
+            child_id INTEGER,
+            service_name VARCHAR(50),
+            attendance_date DATE
+        ) ON COMMIT DROP
+        """
+    )
+    buffer = io.StringIO()
+    attendance_batch[['child_id', 'service_name', 'attendance_date']].to_csv(buffer, index=False, header=False)
+    buffer.seek(0)
+    cursor.copy_expert(
+        "COPY tmp_attendance (child_id, service_name, attendance_date) FROM STDIN WITH CSV",
+        buffer
+    )
+
+    cursor.execute(
+        """
+        INSERT INTO attendance (child_id, service_name, attendance_date, was_present)
+        SELECT child_id, service_name, attendance_date, TRUE
+        FROM tmp_attendance
+        ON CONFLICT (child_id, service_name, attendance_date) DO NOTHING
+        """
+    )
+
+    # Only rows actually inserted (not duplicates) are counted
+    stats['attendance_recorded'] = cursor.rowcount
+    logger.info(f" Recorded {cursor.rowcount} attendance records "
+                f"({len(attendance_batch) - cursor.rowcount} already recorded)")
+
+
 # MAIN
 def main():
     """Main ETL execution"""
@@ -226,14 +300,24 @@ def main():
             return
 
         # Connect to database
+        if not DB_CONFIG["password"]:
+            raise RuntimeError("DB_PASSWORD environment variable is not set; cannot connect to PostgreSQL")
+
         logger.info("Connecting to PostgreSQL...")
         conn = psycopg2.connect(**DB_CONFIG)
-        
-        # Transform & Load
-        process_attendance(df, conn)
-        
-        # Cleanup
-        conn.close()
+
+        # The whole load runs as one transaction: all of it is committed, or none of it
+        conn.autocommit = False
+        try:
+            # Transform & Load
+            process_attendance(df, conn)
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            # Cleanup
+            conn.close()
+
         logger.info("ETL completed successfully")
         
     except Exception as e: